@@ -3,6 +3,9 @@ from datetime import timedelta, datetime, timezone
 from jose import jwt, JWTError
 from sqlmodel import Session, select
 from app.account.models import RefreshToken, User
+from app.account.token_cache import get_token_cache
+import hashlib
+import hmac
 import uuid
 import os
 
@@ -11,9 +14,13 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+EMAIL_TOKEN_EXPIRE_MINUTES = int(os.getenv("EMAIL_TOKEN_EXPIRE_MINUTES", "60"))
 
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
+# Ids of verification / reset tokens that have already been used
+consumed_tokens = get_token_cache()
+
 
 def hash_password(password: str) -> str:
     """Hash a plain text password"""
@@ -118,30 +125,50 @@ def decode_token(token: str):
         return None 
 
 def create_email_verification_token(user_id: int):
-    expire = datetime.now(timezone.utc) + timedelta(hours=1)
-    to_encode = {"sub" : str(user_id), "type": "verify", "exp" : expire}
+    expire = datetime.now(timezone.utc) + timedelta(minutes=EMAIL_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"sub" : str(user_id), "type": "verify", "exp" : expire, "jti": uuid.uuid4().hex}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 
-def verify_token_and_get_user_id(token : str, token_type: str):
-    try:
-        payload = decode_token(token)
-        if not payload or payload.get("type") != token_type:
-            return None
-        return int(payload.get("sub"))
-    except JWTError:
-        return None
-    
 def get_user_by_email(session: Session, email: str):
     stmt = select(User).where(User.email == email)
     return session.exec(stmt).first()
 
 
+def consume_token(token: str, token_type: str):
+    """Decode a single-use token and mark it consumed, without touching the database"""
+    payload = decode_token(token)
+    if not payload or payload.get("type") != token_type:
+        return None
+    if not payload.get("sub") or not payload.get("jti"):
+        return None
+    if not consumed_tokens.add(payload["jti"], int(payload["exp"])):
+        return None
+    return payload
 
-def create_password_token(user_id : int):
-    expire = datetime.now(timezone.utc) + timedelta(hours=1)
-    to_encode = {"sub" : str(user_id), "type" : "reset", "exp": expire}
+
+def release_token(payload: dict):
+    """Un-consume a token whose request failed, so the link can be retried"""
+    consumed_tokens.discard(payload["jti"])
+
+
+def password_fingerprint(hashed_password: str) -> str:
+    """Short keyed digest of a password hash, changes whenever the password does"""
+    digest = hmac.new(SECRET_KEY.encode(), hashed_password.encode(), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+
+
+def create_password_token(user : User):
+    expire = datetime.now(timezone.utc) + timedelta(minutes=EMAIL_TOKEN_EXPIRE_MINUTES)
+    to_encode = {
+        "sub" : str(user.id),
+        "type" : "reset",
+        "exp": expire,
+        "jti": uuid.uuid4().hex,
+        "pwd": password_fingerprint(user.hashed_password),
+    }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
     
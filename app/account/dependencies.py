@@ -1,7 +1,7 @@
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status, Depends
-from sqlmodel import select
-from app.db.config import SessionDep
+from sqlmodel import Session, select
+from app.db.config import SessionDep, ReadSessionDep, routed_session
 from app.account.auth import decode_token
 from app.account.models import User
 
@@ -9,14 +9,32 @@ from app.account.models import User
 oauth2_schema = OAuth2PasswordBearer(tokenUrl='account/login')
 
 
-def get_current_user(session: SessionDep, token : str = Depends(oauth2_schema) ):
-  payload = decode_token(token)
-  if not payload:
-    raise HTTPException(status_code=401, detail="Invalid credentials")
+def _load_user(session: Session, payload: dict):
   stmt = select(User).where(User.id == int(payload.get("sub")))
   user = session.exec(stmt).first()
   
   if not user:
     raise HTTPException(status_code=404, detail="User not found")
   return user
-    
\ No newline at end of file
+
+
+def get_current_user(session: SessionDep, read_session: ReadSessionDep, token : str = Depends(oauth2_schema) ):
+  """Current user for read-only routes, loaded from the replica"""
+  payload = decode_token(token)
+  if not payload:
+    raise HTTPException(status_code=401, detail="Invalid credentials")
+  return _load_user(routed_session(f"user:{payload.get('sub')}", session, read_session), payload)
+
+
+def get_current_user_primary(session: SessionDep, token : str = Depends(oauth2_schema) ):
+  """Current user for routes that modify it, attached to the primary session"""
+  payload = decode_token(token)
+  if not payload:
+    raise HTTPException(status_code=401, detail="Invalid credentials")
+  return _load_user(session, payload)
+
+
+def get_current_admin(user = Depends(get_current_user)):
+  if not user.is_admin:
+    raise HTTPException(status_code=403, detail="Admin privileges required")
+  return user
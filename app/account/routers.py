@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from app.account.services import create_user, authenticate_user, email_verification, verify_email_token, change_password, passwoord_reset_process, reset_password_with_token
 from app.account.models import UserCreate, UserOut
-from app.db.config import SessionDep
+from app.db.config import SessionDep, ReadSessionDep, routed_session
 from fastapi.security import OAuth2PasswordRequestForm
 from app.account.auth import create_tokens, verify_refresh_token, revoke_refresh_token
 from fastapi.responses import JSONResponse
-from app.account.dependencies import get_current_user
+from app.account.dependencies import get_current_user, get_current_user_primary
 import os
 
 router = APIRouter(prefix="/account", tags=["Account"])
@@ -13,18 +13,49 @@ router = APIRouter(prefix="/account", tags=["Account"])
 # Get secure flag from environment (True for production)
 SECURE_COOKIES = os.getenv("SECURE_COOKIES", "false").lower() == "true"
 
-
+# Max queries per request, enforced by QueryProfilerMiddleware
+QUERY_BUDGETS = {
+    "/account/register": 3,
+    "/account/login": 2,
+    "/account/refresh": 6,
+    "/account/me": 1,
+    "/account/logout": 2,
+    "/account/verify-request": 1,
+    "/account/verify": 2,
+    "/account/change-password": 2,
+    "/account/forget-password": 1,
+    "/account/reset-password": 2,
+}
+
+# Admission cost class per route, optionally with a per-route concurrency cap,
+# see app/admission.py. Unlisted routes (docs, /admission, ...) are "default"
+ROUTE_COST_CLASSES = {
+    "/account/me": "read",
+    "/account/login": "hashing",
+    # Signup and password changes can't crowd logins out of the hashing pool
+    "/account/register": ("hashing", 2),
+    "/account/change-password": ("hashing", 2),
+    "/account/reset-password": ("hashing", 2),
+    # A GET, but it commits a write
+    "/account/verify": "default",
+}
+
+
+# Plain def throughout: argon2 hashing and SQLite I/O must run in the threadpool,
+# not on the event loop
 @router.post("/register", response_model=UserOut)
-async def user_register(session: SessionDep, user: UserCreate):
+def user_register(session: SessionDep, user: UserCreate):
     return create_user(session, user)
 
 
 @router.post("/login")
-async def user_login(
+def user_login(
     session: SessionDep, 
+    read_session: ReadSessionDep,
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = authenticate_user(session, form_data.username, form_data.password)
+    read = routed_session(f"email:{form_data.username}", session, read_session)
+    user = authenticate_user(read, form_data.username, form_data.password)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -46,7 +77,7 @@ async def user_login(
 
 
 @router.post("/refresh")
-async def refresh_token(session: SessionDep, request: Request):
+def refresh_token(session: SessionDep, request: Request):
     old_token = request.cookies.get("refresh_token")
     if not old_token:
         raise HTTPException(status_code=401, detail="Missing refresh token")
@@ -82,7 +113,7 @@ def me(user = Depends(get_current_user)):
 
 
 @router.post("/logout")
-async def logout(session: SessionDep, request: Request):
+def logout(session: SessionDep, request: Request):
     token = request.cookies.get("refresh_token")
     if token:
         revoke_refresh_token(session, token)
@@ -101,14 +132,14 @@ def verify_email(session: SessionDep, token: str):
 
 
 @router.post("/change-password")
-def password_changed(session: SessionDep, new_password: str, user= Depends(get_current_user)):
+def password_changed(session: SessionDep, new_password: str, user= Depends(get_current_user_primary)):
     change_password(session, user, new_password)
     return {"message" " Password changed Successfully"}
 
 
 @router.post("/forget-password")
-def forget_password(session: SessionDep, email : str):
-    return passwoord_reset_process(session, email)
+def forget_password(session: SessionDep, read_session: ReadSessionDep, email : str):
+    return passwoord_reset_process(routed_session(f"email:{email}", session, read_session), email)
 
 
 @router.post("/reset-password")
@@ -1,7 +1,14 @@
 from app.account.models import User, RefreshToken, UserCreate, UserOut
 from sqlmodel import Session, select
+import hmac
+from app.db.config import mark_written
 from fastapi import HTTPException
-from app.account.auth import hash_password, verified_password, create_email_verification_token, verify_token_and_get_user_id, get_user_by_email, create_password_token
+from app.account.auth import hash_password, verified_password, create_email_verification_token, consume_token, release_token, get_user_by_email, create_password_token, password_fingerprint
+
+
+def _user_keys(user: User):
+  # Read before commit(), afterwards the instance is expired and would be reloaded
+  return f"user:{user.id}", f"email:{user.email}"
 
 
 # User Register Logic
@@ -25,6 +32,8 @@ def create_user(session: Session, user: UserCreate):
   session.add(new_user)
   session.commit()
   session.refresh(new_user)
+  # Keep this user's reads on the primary until the replica catches up
+  mark_written(*_user_keys(new_user))
   return new_user
 
 
@@ -45,25 +54,35 @@ def email_verification(user: User):
 
 # Email Verified Logic
 def verify_email_token(session: Session, token : str):
-  user_id = verify_token_and_get_user_id(token, "verify")
-  if not user_id:
+  # Replay check happens in memory, before any query
+  payload = consume_token(token, "verify")
+  if not payload:
     raise HTTPException(status_code=400, detail="Invalid or expired token ")
-  stmt = select(User).where(User.id == user_id)
-  user = session.exec(stmt).first()
-  if not user:
-    raise HTTPException(status_code=404, detail="User not found")
-  user.is_verified = True
-  session.add(user)
-  session.commit()
+  try:
+    user = session.get(User, int(payload["sub"]))
+    if not user:
+      raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_verified:
+      keys = _user_keys(user)
+      user.is_verified = True
+      session.add(user)
+      session.commit()
+      mark_written(*keys)
+  except Exception:
+    # Nothing was verified, let the same link be used again
+    release_token(payload)
+    raise
   return { "msg" : "Email Verified Successfully"}
 
 
 # Change Password Logic
 def change_password(session: Session, user: User, new_password: str):
   
+  keys = _user_keys(user)
   user.hashed_password = hash_password(new_password)
   session.add(user)
   session.commit()
+  mark_written(*keys)
   
 
 def passwoord_reset_process(session:Session, email: str):
@@ -71,22 +90,30 @@ def passwoord_reset_process(session:Session, email: str):
   
   if not user:
     raise HTTPException(status_code="404", detail="User not found")
-  token = create_password_token(user.id)
+  token = create_password_token(user)
   link = f"http://localhost:8000/account/reset-password?token={token}"
   print(f"Reset your password : {link}")
   return {"msg" : "Password reset link sent"}
 
 
 def reset_password_with_token(session: Session, token : str, new_password : str ):
-  user_id = verify_token_and_get_user_id(token, "reset")
+  # Replay check happens in memory, before any query
+  payload = consume_token(token, "reset")
   
-  if not user_id:
+  if not payload:
     raise HTTPException(status_code=400, detail="Invalid or expired token")
-  stmt = select(User).where(User.id == user_id)
-  user = session.exec(stmt).first()
-  if not user:
-    raise HTTPException(status_code=404, detail="User not found")
-  change_password(session, user, new_password)
+  try:
+    user = session.get(User, int(payload["sub"]))
+    if not user:
+      raise HTTPException(status_code=404, detail="User not found")
+    # Link was issued for an older password, it dies with it
+    if not hmac.compare_digest(payload.get("pwd", ""), password_fingerprint(user.hashed_password)):
+      raise HTTPException(status_code=400, detail="Invalid or expired token")
+    change_password(session, user, new_password)
+  except Exception:
+    # Password unchanged, let the same link be used again
+    release_token(payload)
+    raise
   return {"message" : "Password Reset Successfully"}
     
   
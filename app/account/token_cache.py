@@ -0,0 +1,58 @@
+from threading import Lock
+import time
+import os
+
+
+class MemoryTokenCache:
+    """In-process set of consumed token ids, each kept until its token expires"""
+
+    SWEEP_INTERVAL_SECONDS = 60
+
+    def __init__(self):
+        self._entries: dict[str, int] = {}
+        self._lock = Lock()
+        self._next_sweep = 0.0
+
+    def add(self, key: str, expires_at: int) -> bool:
+        """Record a token id as consumed. Returns False if it was already consumed"""
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._entries = {k: exp for k, exp in self._entries.items() if exp > now}
+                self._next_sweep = now + self.SWEEP_INTERVAL_SECONDS
+
+            current = self._entries.get(key)
+            if current is not None and current > now:
+                return False
+            self._entries[key] = expires_at
+            return True
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisTokenCache:
+    """Consumed token ids in Redis, shared between workers and hosts"""
+
+    def __init__(self, url: str, prefix: str = "consumed-token:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def add(self, key: str, expires_at: int) -> bool:
+        """Record a token id as consumed. Returns False if it was already consumed"""
+        ttl = max(1, int(expires_at - time.time()))
+        return bool(self._client.set(self._prefix + key, 1, nx=True, ex=ttl))
+
+    def discard(self, key: str):
+        self._client.delete(self._prefix + key)
+
+
+def get_token_cache():
+    """Use Redis when TOKEN_CACHE_URL is set, otherwise an in-process cache"""
+    url = os.getenv("TOKEN_CACHE_URL")
+    if url:
+        return RedisTokenCache(url)
+    return MemoryTokenCache()
@@ -0,0 +1,155 @@
+from starlette.responses import JSONResponse
+import asyncio
+import os
+
+
+class CostClass:
+    """Concurrency limit plus a bounded, deadline-limited wait queue"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+
+    async def acquire(self, timeout: float | None = None) -> bool:
+        """Wait for a slot. Returns False when the request should be shed"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed += 1
+            return False
+
+        if not self._semaphore.locked():
+            # Free slot, take it without a deadline that could expire at zero
+            await self._semaphore.acquire()
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+# Argon2 routes get a small pool so they can't take every threadpool worker,
+# "read" is kept for cheap authenticated reads so they never queue behind anything else
+COST_CLASSES = {
+    "hashing": CostClass(
+        "hashing",
+        concurrency=int(os.getenv("ADMISSION_HASHING_CONCURRENCY", "4")),
+        max_queue=int(os.getenv("ADMISSION_HASHING_QUEUE", "32")),
+        queue_timeout=float(os.getenv("ADMISSION_HASHING_TIMEOUT", "1.0")),
+    ),
+    "read": CostClass(
+        "read",
+        concurrency=int(os.getenv("ADMISSION_READ_CONCURRENCY", "32")),
+        max_queue=int(os.getenv("ADMISSION_READ_QUEUE", "512")),
+        queue_timeout=float(os.getenv("ADMISSION_READ_TIMEOUT", "5.0")),
+    ),
+    "default": CostClass(
+        "default",
+        concurrency=int(os.getenv("ADMISSION_DEFAULT_CONCURRENCY", "16")),
+        max_queue=int(os.getenv("ADMISSION_DEFAULT_QUEUE", "128")),
+        queue_timeout=float(os.getenv("ADMISSION_DEFAULT_TIMEOUT", "2.0")),
+    ),
+}
+
+
+def thread_budget() -> int:
+    """Threads needed so every admitted sync request gets one without queueing"""
+    return sum(cost.concurrency for cost in COST_CLASSES.values())
+
+
+# Per-route limits from the routes table, filled in by AdmissionControlMiddleware
+ROUTE_LIMITS: dict[str, CostClass] = {}
+
+
+def admission_stats() -> dict:
+    return {
+        "classes": {name: cost.stats() for name, cost in COST_CLASSES.items()},
+        "routes": {path: limit.stats() for path, limit in ROUTE_LIMITS.items()},
+    }
+
+
+class AdmissionControlMiddleware:
+    """Admit each request into its route's cost class, or answer 503 before any work
+
+    `routes` maps a path to a class name, or to (class name, route concurrency)
+    to also cap that route inside its class. Unlisted paths are "default".
+    """
+
+    def __init__(self, app, routes: dict | None = None, classes: dict[str, CostClass] | None = None,
+                 route_limits: dict[str, CostClass] | None = None):
+        self.app = app
+        self.classes = COST_CLASSES if classes is None else classes
+        self.route_limits = ROUTE_LIMITS if route_limits is None else route_limits
+        self.routes: dict[str, str] = {}
+        for path, entry in (routes or {}).items():
+            name, limit = entry if isinstance(entry, tuple) else (entry, None)
+            self.routes[path] = name
+            if limit is not None:
+                cost = self.classes[name]
+                self.route_limits[path] = CostClass(path, limit, cost.max_queue, cost.queue_timeout)
+
+    async def _admit(self, path: str) -> list[CostClass] | None:
+        """Acquire the route limit, then the class pool, within one queue deadline"""
+        cost = self.classes[self.routes.get(path, "default")]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + cost.queue_timeout
+        acquired = []
+        for limit in (self.route_limits.get(path), cost):
+            if limit is None:
+                continue
+            if not await limit.acquire(max(0.0, deadline - loop.time())):
+                for held in reversed(acquired):
+                    held.release()
+                return None
+            acquired.append(limit)
+        return acquired
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        acquired = await self._admit(scope["path"])
+        if acquired is None:
+            response = JSONResponse(
+                {"detail": "Server busy, try again shortly"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for held in reversed(acquired):
+                held.release()
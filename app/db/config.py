@@ -1,10 +1,21 @@
 from sqlmodel import create_engine, Session, SQLModel
 import os
+import math
+import time
+import sqlite3
+import logging
+from contextvars import ContextVar
+from threading import Event, Lock, Thread
+from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Depends
 from typing import Annotated
+from app.db.profiler import install_query_profiler
 
 
 
+logger = logging.getLogger(__name__)
+
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
@@ -13,21 +24,144 @@ db_path = os.path.join(BASE_DIR, "sqlite.db")
 DATABASE_URL = f"sqlite:///{db_path}"
 
 engine = create_engine(DATABASE_URL, echo=True)
+install_query_profiler(engine)
+
+# Read replica, e.g. sqlite:////path/to/replica.db locally. Falls back to the primary
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+replica_engine = create_engine(REPLICA_DATABASE_URL, echo=True) if REPLICA_DATABASE_URL else engine
+if replica_engine is not engine:
+  install_query_profiler(replica_engine)
+
+# How long reads stay on the primary after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# Local two-file setup only: how often the primary file is copied into the replica
+REPLICA_SYNC_SECONDS = float(os.getenv("REPLICA_SYNC_SECONDS", "1"))
+STICKY_COOKIE = "db_primary_until"
+
+_recent_writes: dict[str, float] = {}
+_recent_writes_lock = Lock()
+_next_sweep = 0.0
+# Per-request stickiness, filled from and written back to STICKY_COOKIE
+_request_sticky: ContextVar[dict | None] = ContextVar("request_sticky", default=None)
+
+
+def _local_replica() -> bool:
+  return (
+    replica_engine is not engine
+    and engine.url.get_backend_name() == "sqlite"
+    and replica_engine.url.get_backend_name() == "sqlite"
+  )
+
+
+def sync_replica(primary=None, replica=None):
+  """Copy the primary SQLite file into the replica, standing in for real replication"""
+  primary = primary or engine
+  replica = replica or replica_engine
+  src = sqlite3.connect(primary.url.database)
+  dst = sqlite3.connect(replica.url.database)
+  try:
+    src.backup(dst)
+  finally:
+    dst.close()
+    src.close()
+
+
+def _replica_sync_loop(stop: Event):
+  while not stop.wait(REPLICA_SYNC_SECONDS):
+    try:
+      sync_replica()
+    except sqlite3.Error:
+      logger.exception("Replica sync failed")
+
+
+def start_replica_sync() -> Event | None:
+  """Keep a local SQLite replica roughly REPLICA_SYNC_SECONDS behind the primary"""
+  if not _local_replica():
+    return None
+  stop = Event()
+  Thread(target=_replica_sync_loop, args=(stop,), daemon=True).start()
+  return stop
 
 
 def creat_tables():
   SQLModel.metadata.create_all(engine)
+  # Local two-file setup, a real replica gets its schema through replication
+  if _local_replica():
+    sync_replica()
 
 
 
 def get_session():
   with Session(engine) as session:
     yield session
-    
-
-SessionDep = Annotated[Session, Depends(get_session)]
-
-
 
 
+def get_read_session():
+  with Session(replica_engine) as session:
+    yield session
+    
 
+SessionDep = Annotated[Session, Depends(get_session)]
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
+
+
+def mark_written(*keys: str):
+  """Send reads for these keys, and this client's reads, to the primary for a few seconds"""
+  global _recent_writes, _next_sweep
+  now = time.time()
+  until = now + REPLICA_STICKY_SECONDS
+  with _recent_writes_lock:
+    # Drop keys that expired without ever being read again
+    if now >= _next_sweep:
+      _recent_writes = {k: t for k, t in _recent_writes.items() if t > now}
+      _next_sweep = now + REPLICA_STICKY_SECONDS
+    for key in keys:
+      _recent_writes[key] = until
+
+  # Other workers don't see _recent_writes, the cookie carries it to them
+  sticky = _request_sticky.get()
+  if sticky is not None:
+    sticky["until"] = until
+    sticky["written"] = True
+
+
+def routed_session(key: str, session: Session, read_session: Session) -> Session:
+  """Primary session if `key` or this client wrote recently, otherwise the replica session"""
+  now = time.time()
+  sticky = _request_sticky.get()
+  if sticky is not None and sticky["until"] > now:
+    return session
+
+  with _recent_writes_lock:
+    until = _recent_writes.get(key)
+    if until is None:
+      return read_session
+    if until <= now:
+      _recent_writes.pop(key, None)
+      return read_session
+  return session
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+  """Carry recent-write stickiness between requests, and so between workers, in a cookie"""
+
+  async def dispatch(self, request, call_next):
+    try:
+      until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+      until = 0.0
+    # Never trust a client for longer than one sticky window
+    sticky = {"until": min(until, time.time() + REPLICA_STICKY_SECONDS), "written": False}
+
+    token = _request_sticky.set(sticky)
+    try:
+      response = await call_next(request)
+    finally:
+      _request_sticky.reset(token)
+
+    if sticky["written"]:
+      response.set_cookie(
+        STICKY_COOKIE, f"{sticky['until']:.3f}",
+        max_age=math.ceil(REPLICA_STICKY_SECONDS), httponly=True, samesite="lax",
+      )
+    return response
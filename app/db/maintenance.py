@@ -0,0 +1,172 @@
+"""Offline maintenance for the refresh token table.
+
+Archives revoked and expired refresh tokens to gzipped NDJSON segments, deletes
+them in small batches so the API can keep writing in between, then rebuilds
+indexes and lets SQLite hand freed pages back to the filesystem.
+
+    python -m app.db.maintenance --archive-dir archive/
+"""
+from datetime import datetime, timezone
+from sqlalchemy import delete, event, or_, text
+from sqlmodel import Session, select
+from app.db.config import engine
+from app.account.models import RefreshToken
+import argparse
+import gzip
+import json
+import os
+import time
+import uuid
+
+
+def _set_busy_timeout(dbapi_conn, connection_record):
+    # Wait for API writers instead of failing with "database is locked"
+    dbapi_conn.execute("PRAGMA busy_timeout = 5000")
+
+
+def _db_size(conn) -> dict:
+    page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    freelist = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return {"bytes": page_size * page_count, "free_pages": freelist, "free_bytes": page_size * freelist}
+
+
+def database_size() -> dict:
+    """Size of the SQLite database file, empty for other backends"""
+    with engine.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            return {}
+        return _db_size(conn)
+
+
+def _write_segment(path: str, rows: list[dict]):
+    """Write a gzipped NDJSON segment and make sure it is on disk, trailer included"""
+    # "x": never overwrite a segment whose rows may already be deleted
+    with open(path, "xb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for row in rows:
+                gz.write((json.dumps(row) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    # And the directory entry, so the file survives a crash too.
+    # Windows can't open a directory for fsync, NTFS journals the entry itself
+    if os.name == "nt":
+        return
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def archive_tokens(archive_dir: str, batch_size: int = 500, pause: float = 0.05) -> int:
+    """Move revoked/expired tokens to archive segments, one short transaction per batch"""
+    os.makedirs(archive_dir, exist_ok=True)
+    # Unique even for two runs started in the same second
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+    last_id = 0
+    archived = 0
+    segment = 0
+
+    while True:
+        # Read the batch and end the transaction, no lock is held during file I/O
+        with Session(engine) as session:
+            stmt = (
+                select(RefreshToken)
+                .where(or_(RefreshToken.revoked == True, RefreshToken.expires_at < now))  # noqa: E712
+                .where(RefreshToken.id > last_id)
+                .order_by(RefreshToken.id)
+                .limit(batch_size)
+            )
+            rows = [token.model_dump(mode="json") for token in session.exec(stmt).all()]
+        if not rows:
+            break
+
+        # Segment is durable on disk before its rows are deleted
+        path = os.path.join(archive_dir, f"refresh_token-{run_id}-{segment:05d}.ndjson.gz")
+        _write_segment(path, rows)
+
+        # Separate short write transaction, starts with the write so SQLite's
+        # busy timeout applies instead of failing a read-to-write lock upgrade
+        ids = [row["id"] for row in rows]
+        with Session(engine) as session:
+            session.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+            session.commit()
+
+        last_id = ids[-1]
+        archived += len(ids)
+        segment += 1
+        # Give API writers a chance at the database lock
+        time.sleep(pause)
+
+    return archived
+
+
+def compact(vacuum_pages: int = 1000, pause: float = 0.05, enable_incremental: bool = False) -> dict:
+    """Rebuild indexes, reclaim free pages in steps and refresh planner stats"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name != "sqlite":
+            conn.execute(text(f"ANALYZE {RefreshToken.__tablename__}"))
+            return {}
+
+        conn.exec_driver_sql(f"REINDEX {RefreshToken.__tablename__}")
+
+        auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if auto_vacuum != 2 and enable_incremental:
+            # One-off full VACUUM, needed for the auto_vacuum mode to take effect
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            auto_vacuum = 2
+
+        if auto_vacuum == 2:
+            while conn.exec_driver_sql("PRAGMA freelist_count").scalar():
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({vacuum_pages})")
+                time.sleep(pause)
+
+        conn.exec_driver_sql(f"ANALYZE {RefreshToken.__tablename__}")
+        conn.exec_driver_sql("PRAGMA optimize")
+        after = _db_size(conn)
+
+    after["incremental_vacuum"] = auto_vacuum == 2
+    return after
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive and purge old refresh tokens")
+    parser.add_argument("--archive-dir", default="archive", help="where NDJSON segments are written")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows archived and deleted per transaction")
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between batches")
+    parser.add_argument("--vacuum-pages", type=int, default=1000, help="pages freed per incremental_vacuum step")
+    parser.add_argument(
+        "--enable-incremental-vacuum", action="store_true",
+        help="switch the database to auto_vacuum=INCREMENTAL (runs one full VACUUM)",
+    )
+    args = parser.parse_args(argv)
+
+    engine.echo = False
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_busy_timeout)
+
+    # Measured before archiving, so the report covers the deletes as well
+    before = database_size()
+
+    archived = archive_tokens(args.archive_dir, args.batch_size, args.pause)
+    print(f"Archived and deleted {archived} refresh tokens to {args.archive_dir}")
+
+    after = compact(args.vacuum_pages, args.pause, args.enable_incremental_vacuum)
+    if after:
+        print(
+            f"Database {before['bytes']} -> {after['bytes']} bytes, "
+            f"reclaimed {before['bytes'] - after['bytes']} bytes"
+        )
+        if not after["incremental_vacuum"]:
+            print(
+                f"{after['free_pages']} free pages ({after['free_bytes']} bytes) are reusable but were not "
+                f"returned to the OS, run once with --enable-incremental-vacuum"
+            )
+
+
+if __name__ == "__main__":
+    main()
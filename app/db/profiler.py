@@ -0,0 +1,146 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+import logging
+import time
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Add X-DB-* headers to every response
+QUERY_PROFILE_HEADERS = os.getenv("QUERY_PROFILE_HEADERS", "false").lower() == "true"
+# Log one line with the query stats of every request
+QUERY_PROFILE_LOG = os.getenv("QUERY_PROFILE_LOG", "false").lower() == "true"
+# Slowest statement is cut to this many characters in logs and headers
+SLOWEST_STATEMENT_LENGTH = 200
+# Raise instead of logging when a route goes over its query budget (for tests)
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+# Same statement this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+
+
+class QueryStats:
+    """Queries issued during one request or one query_budget block"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: str | None = None
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def slowest_statement_summary(self) -> str:
+        """Slowest statement on one line, truncated, safe for a header"""
+        statement = " ".join((self.slowest_statement or "").split())
+        if len(statement) > SLOWEST_STATEMENT_LENGTH:
+            statement = statement[:SLOWEST_STATEMENT_LENGTH - 3] + "..."
+        return statement.encode("latin-1", "replace").decode("latin-1")
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict[str, int]:
+        """Statements issued at least `threshold` times"""
+        return {stmt: n for stmt, n in self.statements.items() if n >= threshold}
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+_recorders: list[QueryStats] = []
+_recorders_lock = Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the per-statement context, so a failed statement leaves nothing behind
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_start
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if _recorders:
+        with _recorders_lock:
+            for recorder in _recorders:
+                recorder.record(statement, duration)
+
+
+def install_query_profiler(engine):
+    """Time every statement executed on the engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Fail if the block issues more than `max_queries` statements
+
+    with query_budget(2):
+        client.get("/account/me", headers=auth)
+    """
+    stats = QueryStats()
+    with _recorders_lock:
+        _recorders.append(stats)
+    try:
+        yield stats
+    finally:
+        with _recorders_lock:
+            _recorders.remove(stats)
+    if stats.count > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {stats.count}: "
+            f"{list(stats.statements.elements())}"
+        )
+
+
+class QueryProfilerMiddleware(BaseHTTPMiddleware):
+    """Collect query count, total time and slowest statement for each request"""
+
+    def __init__(self, app, budgets: dict[str, int] | None = None):
+        super().__init__(app)
+        self.budgets = budgets or {}
+
+    async def dispatch(self, request, call_next):
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            _current_stats.reset(token)
+
+        route = request.scope.get("route")
+        path = getattr(route, "path", request.url.path)
+
+        if QUERY_PROFILE_LOG:
+            logger.info(
+                "%s %s: %d queries in %.1fms (slowest %.1fms: %s)",
+                request.method, path, stats.count,
+                stats.total_time * 1000, stats.slowest_time * 1000,
+                stats.slowest_statement_summary(),
+            )
+        for statement, n in stats.repeated().items():
+            logger.warning("Possible N+1 on %s %s: %dx %s", request.method, path, n, statement)
+
+        budget = self.budgets.get(path)
+        if budget is not None and stats.count > budget:
+            message = f"{request.method} {path} issued {stats.count} queries, budget is {budget}"
+            if QUERY_BUDGET_STRICT:
+                raise AssertionError(message)
+            logger.warning(message)
+
+        if QUERY_PROFILE_HEADERS:
+            response.headers["X-DB-Query-Count"] = str(stats.count)
+            response.headers["X-DB-Query-Time"] = f"{stats.total_time * 1000:.1f}ms"
+            if stats.slowest_statement:
+                response.headers["X-DB-Slowest-Query"] = stats.slowest_statement_summary()
+                response.headers["X-DB-Slowest-Query-Time"] = f"{stats.slowest_time * 1000:.1f}ms"
+        return response
@@ -1,16 +1,36 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
-from app.db.config import creat_tables
-from app.account.routers import router as account_router
+from app.db.config import creat_tables, start_replica_sync, ReadYourWritesMiddleware
+from app.account.routers import router as account_router, QUERY_BUDGETS, ROUTE_COST_CLASSES
+from app.db.profiler import QueryProfilerMiddleware
+from app.admission import AdmissionControlMiddleware, admission_stats, thread_budget
+from app.account.dependencies import get_current_admin
+from anyio import to_thread
 
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
   creat_tables()
+  # Admitted requests must not wait again in anyio's thread limiter (40 by default),
+  # that queue has no deadline and doesn't show up in the admission stats
+  limiter = to_thread.current_default_thread_limiter()
+  limiter.total_tokens = max(limiter.total_tokens, thread_budget())
+  replica_sync = start_replica_sync()
   yield
+  if replica_sync:
+    replica_sync.set()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(QueryProfilerMiddleware, budgets=QUERY_BUDGETS)
+# Added last so it runs first and sheds load before any other work
+app.add_middleware(AdmissionControlMiddleware, routes=ROUTE_COST_CLASSES)
+
+
+@app.get("/admission")
+def admission(admin = Depends(get_current_admin)):
+  return admission_stats()
 
 
 
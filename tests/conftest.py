@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+from app.main import app
+from app.db.config import get_session, get_read_session
+from app.db.profiler import install_query_profiler
+from app.account.auth import hash_password
+from app.account.models import User
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    install_query_profiler(engine)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine):
+    def override_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_session
+    app.dependency_overrides[get_read_session] = override_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def make_user(engine):
+    """Insert a user straight into the test database"""
+    def make_user(email="user@example.com", password="secret1", **fields):
+        with Session(engine) as session:
+            user = User(email=email, name="Test", hashed_password=hash_password(password), **fields)
+            session.add(user)
+            session.commit()
+            session.refresh(user)
+            return user
+
+    return make_user
@@ -0,0 +1,92 @@
+import asyncio
+import httpx
+from starlette.responses import JSONResponse
+from app.admission import AdmissionControlMiddleware, CostClass
+from app.account.auth import create_access_token
+from app.account.routers import ROUTE_COST_CLASSES
+
+
+def run_saturated(requests):
+    """Hold every non-/me request open, fire `requests` and return their responses"""
+    classes = {
+        "hashing": CostClass("hashing", concurrency=2, max_queue=4, queue_timeout=0.05),
+        "read": CostClass("read", concurrency=4, max_queue=4, queue_timeout=1.0),
+        "default": CostClass("default", concurrency=4, max_queue=4, queue_timeout=1.0),
+    }
+
+    async def main():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            if scope["path"] != "/account/me":
+                await release.wait()
+            await JSONResponse({"ok": True})(scope, receive, send)
+
+        middleware = AdmissionControlMiddleware(app, routes=ROUTE_COST_CLASSES, classes=classes, route_limits={})
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = [asyncio.create_task(client.post(path)) for path in requests]
+            await asyncio.sleep(0.01)
+            shed = await client.post("/account/login")
+            me = await client.get("/account/me")
+            release.set()
+            held = await asyncio.gather(*busy)
+        return shed, me, held
+
+    return asyncio.run(main()), classes
+
+
+def test_saturated_hashing_pool_sheds_but_me_is_admitted():
+    (shed, me, held), classes = run_saturated(["/account/login", "/account/login"])
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert me.status_code == 200
+    assert [r.status_code for r in held] == [200, 200]
+    assert classes["hashing"].shed == 1
+    assert classes["read"].shed == 0
+
+
+def test_route_limit_caps_a_route_inside_its_class():
+    # register capped at 1: a second register is shed while the hashing pool has room
+    routes = dict(ROUTE_COST_CLASSES, **{"/account/register": ("hashing", 1)})
+    classes = {"hashing": CostClass("hashing", concurrency=4, max_queue=4, queue_timeout=0.05),
+               "default": CostClass("default", concurrency=4, max_queue=4, queue_timeout=1.0)}
+    route_limits = {}
+
+    async def main():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            if scope["path"] == "/account/register":
+                await release.wait()
+            await JSONResponse({"ok": True})(scope, receive, send)
+
+        middleware = AdmissionControlMiddleware(app, routes=routes, classes=classes, route_limits=route_limits)
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = asyncio.create_task(client.post("/account/register"))
+            await asyncio.sleep(0.01)
+            second = await client.post("/account/register")
+            login = await client.post("/account/login")
+            release.set()
+            await busy
+        return second, login
+
+    second, login = asyncio.run(main())
+    assert second.status_code == 503
+    assert login.status_code == 200
+    assert route_limits["/account/register"].shed == 1
+
+
+def test_admission_stats_need_an_admin(client, make_user):
+    user = make_user()
+    admin = make_user(email="admin@example.com", is_admin=True)
+
+    assert client.get("/admission").status_code == 401
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    assert client.get("/admission", headers=auth).status_code == 403
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(admin.id)})}"}
+    response = client.get("/admission", headers=auth)
+    assert response.status_code == 200
+    assert set(response.json()["classes"]) == {"hashing", "read", "default"}
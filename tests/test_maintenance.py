@@ -0,0 +1,46 @@
+import glob
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, select
+from app.db import maintenance
+from app.account.models import RefreshToken
+
+
+def test_archive_tokens_moves_only_dead_tokens(engine, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "engine", engine)
+    user = make_user()
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        for i in range(5):
+            session.add(RefreshToken(user_id=user.id, token=f"revoked-{i}", expires_at=now + timedelta(days=1), revoked=True))
+            session.add(RefreshToken(user_id=user.id, token=f"expired-{i}", expires_at=now - timedelta(days=1)))
+            session.add(RefreshToken(user_id=user.id, token=f"live-{i}", expires_at=now + timedelta(days=1)))
+        session.commit()
+
+    archive_dir = tmp_path / "archive"
+    assert maintenance.archive_tokens(str(archive_dir), batch_size=3, pause=0) == 10
+
+    with Session(engine) as session:
+        remaining = {token.token for token in session.exec(select(RefreshToken)).all()}
+    assert remaining == {f"live-{i}" for i in range(5)}
+
+    segments = sorted(glob.glob(str(archive_dir / "*.ndjson.gz")))
+    assert len(segments) == 4
+    archived = []
+    for segment in segments:
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            archived += [json.loads(line) for line in f]
+    assert sorted(row["token"] for row in archived) == sorted(
+        [f"revoked-{i}" for i in range(5)] + [f"expired-{i}" for i in range(5)]
+    )
+    assert all(row["user_id"] == user.id for row in archived)
+
+    # A second run right after must add its own segment, not overwrite the first run's
+    with Session(engine) as session:
+        session.add(RefreshToken(user_id=user.id, token="late", expires_at=now, revoked=True))
+        session.commit()
+    contents = {segment: open(segment, "rb").read() for segment in segments}
+    assert maintenance.archive_tokens(str(archive_dir), batch_size=3, pause=0) == 1
+    assert len(glob.glob(str(archive_dir / "*.ndjson.gz"))) == 5
+    assert all(open(segment, "rb").read() == data for segment, data in contents.items())
@@ -0,0 +1,53 @@
+from sqlmodel import Session
+from app.db import profiler
+from app.db.profiler import query_budget
+from app.account.routers import QUERY_BUDGETS
+from app.account.auth import create_access_token, create_email_verification_token, create_password_token
+from app.account.models import User
+
+
+# Routes driven so far, to check every budgeted route is covered
+called = set()
+
+
+def call(client, method, path, **kwargs):
+    """Request `path` and fail if it goes over its QUERY_BUDGETS entry"""
+    with query_budget(QUERY_BUDGETS[path]):
+        response = client.request(method, path, **kwargs)
+    assert response.status_code == 200, response.text
+    called.add(path)
+    return response
+
+
+def test_every_route_stays_within_its_query_budget(client, engine):
+    user = {"email": "budget@example.com", "name": "Budget", "password": "secret1"}
+    user_id = call(client, "POST", "/account/register", json=user).json()["id"]
+
+    login = call(client, "POST", "/account/login", data={"username": user["email"], "password": "secret1"})
+    auth = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    call(client, "GET", "/account/me", headers=auth)
+    call(client, "POST", "/account/verify-request", headers=auth)
+    call(client, "GET", "/account/verify", params={"token": create_email_verification_token(user_id)})
+    call(client, "POST", "/account/refresh")
+    call(client, "POST", "/account/change-password", params={"new_password": "secret2"}, headers=auth)
+    call(client, "POST", "/account/forget-password", params={"email": user["email"]})
+
+    with Session(engine) as session:
+        reset_token = create_password_token(session.get(User, user_id))
+    call(client, "POST", "/account/reset-password", params={"token": reset_token, "new_password": "secret3"})
+    call(client, "POST", "/account/logout")
+
+    assert called == set(QUERY_BUDGETS)
+
+
+def test_profile_headers_name_the_slowest_statement(client, make_user, monkeypatch):
+    monkeypatch.setattr(profiler, "QUERY_PROFILE_HEADERS", True)
+    user = make_user()
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+    response = client.get("/account/me", headers=auth)
+
+    assert response.headers["X-DB-Query-Count"] == "1"
+    assert response.headers["X-DB-Slowest-Query"].startswith("SELECT user.email")
+    assert response.headers["X-DB-Slowest-Query-Time"].endswith("ms")
@@ -0,0 +1,126 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+from app.main import app
+from app.db import config
+from app.db.config import get_session, get_read_session, sync_replica
+from app.account.auth import create_access_token, create_email_verification_token, hash_password
+from app.account.models import User
+
+STICKY_SECONDS = 0.5
+
+
+@pytest.fixture
+def engines(tmp_path, monkeypatch):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    SQLModel.metadata.create_all(primary)
+    sync_replica(primary, replica)
+
+    # Statements seen by each engine, to tell where a read went
+    queries = {"primary": 0, "replica": 0}
+    for name, engine in (("primary", primary), ("replica", replica)):
+        def count(*args, name=name):
+            queries[name] += 1
+        event.listen(engine, "after_cursor_execute", count)
+
+    monkeypatch.setattr(config, "REPLICA_STICKY_SECONDS", STICKY_SECONDS)
+    monkeypatch.setattr(config, "_recent_writes", {})
+    yield primary, replica, queries
+    primary.dispose()
+    replica.dispose()
+
+
+def client_for(primary, replica):
+    def primary_session():
+        with Session(primary) as session:
+            yield session
+
+    def replica_session():
+        with Session(replica) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = primary_session
+    app.dependency_overrides[get_read_session] = replica_session
+    return TestClient(app)
+
+
+@pytest.fixture
+def client(engines):
+    primary, replica, _ = engines
+    yield client_for(primary, replica)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def user(engines):
+    primary, replica, _ = engines
+    with Session(primary) as session:
+        user = User(email="replica@example.com", name="Replica", hashed_password=hash_password("secret1"))
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    sync_replica(primary, replica)
+    return user
+
+
+def me(client, user, queries):
+    """GET /me and return which engine served it"""
+    before = dict(queries)
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    assert client.get("/account/me", headers=auth).status_code == 200
+    return "primary" if queries["primary"] > before["primary"] else "replica"
+
+
+def test_reads_go_to_the_replica(client, engines, user):
+    assert me(client, user, engines[2]) == "replica"
+
+
+def test_reads_stick_to_the_primary_after_change_password(client, engines, user):
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    response = client.post("/account/change-password", params={"new_password": "secret2"}, headers=auth)
+    assert response.status_code == 200
+
+    assert me(client, user, engines[2]) == "primary"
+    # Replica still has the old hash, login must not read it
+    response = client.post("/account/login", data={"username": user.email, "password": "secret2"})
+    assert response.status_code == 200
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    assert me(client, user, engines[2]) == "replica"
+
+
+def test_reads_stick_to_the_primary_after_verify_email(client, engines, user):
+    token = create_email_verification_token(user.id)
+    assert client.get("/account/verify", params={"token": token}).status_code == 200
+
+    assert me(client, user, engines[2]) == "primary"
+    time.sleep(STICKY_SECONDS + 0.1)
+    assert me(client, user, engines[2]) == "replica"
+
+
+def test_cookie_keeps_stickiness_across_workers(client, engines, user):
+    token = create_email_verification_token(user.id)
+    assert client.get("/account/verify", params={"token": token}).status_code == 200
+
+    # Another worker: no in-process record of the write, only the client's cookie
+    config._recent_writes.clear()
+    assert me(client, user, engines[2]) == "primary"
+
+    other_client = client_for(engines[0], engines[1])
+    assert me(other_client, user, engines[2]) == "replica"
+
+
+def test_sync_replica_copies_primary_writes(client, engines):
+    primary, replica, queries = engines
+    new_user = {"email": "new@example.com", "name": "New", "password": "secret1"}
+    assert client.post("/account/register", json=new_user).status_code == 200
+    sync_replica(primary, replica)
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    before = queries["replica"]
+    response = client.post("/account/login", data={"username": new_user["email"], "password": "secret1"})
+    assert response.status_code == 200
+    assert queries["replica"] > before
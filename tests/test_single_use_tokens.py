@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from jose import jwt
+from sqlmodel import Session
+from app.account.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    create_email_verification_token,
+    create_password_token,
+)
+from app.account.models import User
+
+
+def test_verify_token_is_single_use(client, make_user, engine):
+    user = make_user()
+    token = create_email_verification_token(user.id)
+
+    assert client.get("/account/verify", params={"token": token}).status_code == 200
+    assert client.get("/account/verify", params={"token": token}).status_code == 400
+    with Session(engine) as session:
+        assert session.get(User, user.id).is_verified
+
+
+def test_reset_token_is_single_use(client, make_user):
+    token = create_password_token(make_user())
+    params = {"token": token, "new_password": "secret2"}
+
+    assert client.post("/account/reset-password", params=params).status_code == 200
+    assert client.post("/account/reset-password", params=params).status_code == 400
+
+
+def test_reset_token_dies_with_password_change(client, make_user):
+    user = make_user()
+    token = create_password_token(user)
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+    response = client.post("/account/change-password", params={"new_password": "secret2"}, headers=auth)
+    assert response.status_code == 200
+    response = client.post("/account/reset-password", params={"token": token, "new_password": "secret3"})
+    assert response.status_code == 400
+
+
+def test_failed_request_releases_token(client, make_user):
+    # Issued for a user that doesn't exist yet
+    token = create_email_verification_token(42)
+    assert client.get("/account/verify", params={"token": token}).status_code == 404
+
+    make_user(id=42)
+    assert client.get("/account/verify", params={"token": token}).status_code == 200
+
+
+def test_token_without_jti_is_rejected(client, make_user):
+    user = make_user()
+    expire = datetime.now(timezone.utc) + timedelta(minutes=5)
+    token = jwt.encode({"sub": str(user.id), "type": "verify", "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+    assert client.get("/account/verify", params={"token": token}).status_code == 400